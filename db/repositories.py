@@ -1,7 +1,7 @@
 # db/repositories.py
 from sqlalchemy import select, func, desc
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List
 import difflib
 
 from .models import User, Project, Session, FileVersion, ProjectSnapshot, SandboxState, SessionStatus
@@ -116,8 +116,8 @@ class FileRepository:
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
     
-    async def get_all_latest_files(self, project_id: str) -> List[FileVersion]:
-        """Get latest version of all files in a project"""
+    def _latest_files_stmt(self, project_id: str):
+        """Select the latest version of every file in a project"""
         subq = select(
             FileVersion.file_path,
             func.max(FileVersion.version).label("max_version")
@@ -130,9 +130,21 @@ class FileRepository:
             (FileVersion.file_path == subq.c.file_path) &
             (FileVersion.version == subq.c.max_version)
         ).where(FileVersion.project_id == project_id)
-        
-        result = await self.session.execute(stmt)
+        return stmt
+    
+    async def get_all_latest_files(self, project_id: str) -> List[FileVersion]:
+        """Get latest version of all files in a project"""
+        result = await self.session.execute(self._latest_files_stmt(project_id))
         return list(result.scalars().all())
+    
+    async def iter_all_latest_files(
+        self,
+        project_id: str
+    ) -> AsyncIterator[FileVersion]:
+        """Stream the latest version of each project file as rows arrive"""
+        result = await self.session.stream(self._latest_files_stmt(project_id))
+        async for file_version in result.scalars():
+            yield file_version
 
 
 class ProjectRepository:
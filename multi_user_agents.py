@@ -1,22 +1,18 @@
 # multi_user_agents.py
 from agno.agent import Agent
-from agno.tools import tool
-from agno.models.openrouter import OpenRouter
-from agno.os import AgentOS
-from agno.db.sqlite import SqliteDb
+from agno.utils.log import configure_agno_logging, set_log_level_to_debug
 
+import atexit
 import dotenv
-import os
-
+import functools
+import json
 import logging
-from agno.agent import Agent
-from agno.utils.log import configure_agno_logging, set_log_level_to_debug
+import logging.handlers
+import os
+import queue
+import sys
 
-from file_tools_e2b import FileTools
 from sandbox_manager import get_multi_tenant_manager
-from command_tools_e2b import CommandTools
-from edit_tools_e2b import EditTools
-from search_tool import search_web
 
 # Database imports
 from db import init_db, close_db
@@ -30,55 +26,205 @@ dotenv.load_dotenv()
 # CONFIGURE COMPREHENSIVE FILE LOGGING FOR AGNO AGENTS
 # =============================================================================
 
-# Create a custom logger that logs to both console and file
-agno_file_logger = logging.getLogger("agno")
+class FdFileHandler(logging.FileHandler):
+    """
+    FileHandler that writes encoded records straight to the raw fd.
+
+    Records are collected in a bytearray and written with os.write() (retried
+    on short writes) once the buffer reaches buffer_size, or immediately for
+    records at flush_level and above.
+    """
+
+    terminator_bytes = b"\n"
+
+    def __init__(
+        self,
+        filename,
+        mode="a",
+        encoding=None,
+        delay=False,
+        buffer_size: int = 64 * 1024,
+        flush_level: int = logging.WARNING,
+    ):
+        self.buffer_size = buffer_size
+        self.flush_level = flush_level
+        self._buffer = bytearray()
+        super().__init__(filename, mode=mode, encoding=encoding, delay=delay)
+
+    def _open(self):
+        stream = super()._open()
+        self._fd = stream.fileno()
+        return stream
+
+    def emit(self, record):
+        try:
+            self._buffer += (
+                self.format(record).encode(self.encoding or "utf-8")
+                + self.terminator_bytes
+            )
+            if (
+                len(self._buffer) >= self.buffer_size
+                or record.levelno >= self.flush_level
+            ):
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._buffer:
+                if self.stream is None:
+                    self.stream = self._open()
+                # os.write() may write less than asked; loop until drained
+                written = 0
+                try:
+                    with memoryview(self._buffer) as data:
+                        while written < len(data):
+                            with data[written:] as chunk:
+                                written += os.write(self._fd, chunk)
+                finally:
+                    # On error the rest of the batch is dropped, as FileHandler
+                    # drops a record it fails to write, so the buffer can't grow
+                    # without bound while the disk is full
+                    self._buffer.clear()
+        finally:
+            self.release()
+
+    def close(self):
+        # FileHandler.close() skips flush() when the file was never opened
+        self.flush()
+        super().close()
+
+
+class CachedFormatter(logging.Formatter):
+    """
+    Formatter that reuses the rendered asctime for records in the same second
+    and exposes a memoized "[filename:lineno]" string as %(location)s.
+
+    Only valid with a datefmt that has no sub-second fields.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_sec = None
+        self._last_asctime = ""
+        # Bounded by the number of logging call sites
+        self._locations: dict = {}
+
+    def format(self, record):
+        key = (record.pathname, record.lineno)
+        location = self._locations.get(key)
+        if location is None:
+            location = self._locations[key] = f"[{record.filename}:{record.lineno}]"
+        record.location = location
+        return super().format(record)
+
+    def formatTime(self, record, datefmt=None):
+        sec = int(record.created)
+        if sec != self._last_sec:
+            self._last_asctime = super().formatTime(record, datefmt)
+            self._last_sec = sec
+        return self._last_asctime
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener that flushes its handlers each time the queue runs dry"""
+
+    def dequeue(self, block):
+        # One write per burst: buffered records go out before the thread idles
+        if block and self.queue.empty():
+            for handler in self.handlers:
+                try:
+                    handler.flush()
+                except Exception:
+                    # Report and keep going; an exception here would end the
+                    # listener thread and leave records piling up in the queue
+                    handler.handleError(
+                        logging.makeLogRecord(
+                            {"msg": "Failed to flush %r", "args": (handler,)}
+                        )
+                    )
+        return self.queue.get(block)
 
-# Clear any existing handlers to avoid duplicates
-if agno_file_logger.handlers:
-    agno_file_logger.handlers.clear()
 
-# Create file handler for persistent logging
+# Create a custom logger that logs to both console and file
+agno_file_logger = logging.getLogger("agno")
 log_file_path = os.path.join(os.path.dirname(__file__), "debug_logs.log")
-file_handler = logging.FileHandler(log_file_path, mode="a", encoding="utf-8")
-file_handler.setLevel(logging.DEBUG)
 
-# Create detailed formatter for file logs
-file_formatter = logging.Formatter(
-    fmt="%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
+# Verbosity for agent logs; DEBUG also enables Agno's level-2 debug tracing
+log_level = getattr(
+    logging, os.environ.get("AGNO_LOG_LEVEL", "INFO").upper(), logging.INFO
 )
-file_handler.setFormatter(file_formatter)
 
-# Add file handler to logger
-agno_file_logger.addHandler(file_handler)
-agno_file_logger.setLevel(logging.DEBUG)
-agno_file_logger.propagate = False
 
-# Also add a console handler for real-time monitoring (optional)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_formatter = logging.Formatter("%(levelname)s: %(message)s")
-console_handler.setFormatter(console_formatter)
-agno_file_logger.addHandler(console_handler)
+def _configure_logging():
+    """Attach file/console handlers to the agno logger (runs once per process)"""
+    # Marker lives on the process-wide logger so it survives module re-imports
+    if getattr(agno_file_logger, "_configured", False):
+        return
+
+    # Drop handlers agno attached to this logger at import time so records
+    # only go through the queue below
+    for handler in agno_file_logger.handlers[:]:
+        agno_file_logger.removeHandler(handler)
+
+    # Create file handler for persistent logging (opened on first write)
+    file_handler = FdFileHandler(
+        log_file_path, mode="a", encoding="utf-8", delay=True
+    )
+    file_handler.setLevel(log_level)
 
-# Configure Agno to use our custom logger
-configure_agno_logging(custom_default_logger=agno_file_logger)
+    # Create detailed formatter for file logs
+    file_formatter = CachedFormatter(
+        fmt="%(asctime)s - %(name)s - %(levelname)s - %(location)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    file_handler.setFormatter(file_formatter)
+
+    handlers = [file_handler]
+
+    # Console handler for real-time monitoring, opt-in via AGNO_CONSOLE_LOG=1
+    if os.environ.get("AGNO_CONSOLE_LOG", "0") == "1":
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.WARNING)
+        console_formatter = logging.Formatter("%(levelname)s: %(message)s")
+        console_handler.setFormatter(console_formatter)
+        handlers.append(console_handler)
+
+    # Callers only enqueue records; a background listener thread does the
+    # formatting and I/O for the handlers
+    listener = DrainingQueueListener(
+        queue.Queue(-1), *handlers, respect_handler_level=True
+    )
+    agno_file_logger.addHandler(logging.handlers.QueueHandler(listener.queue))
+    agno_file_logger.setLevel(log_level)
+    agno_file_logger.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
 
-# Enable debug logging
-set_log_level_to_debug(level=2)
+    # Configure Agno to use our custom logger
+    configure_agno_logging(custom_default_logger=agno_file_logger)
 
-print(f"✓ Logging configured - All agent logs will be saved to: {log_file_path}")
+    # Enable Agno debug logging only when explicitly requested
+    if log_level == logging.DEBUG:
+        set_log_level_to_debug(level=2)
 
+    agno_file_logger.info("Logging configured -> %s", log_file_path)
 
-async def create_user_agent(user_id: str, project_id: str) -> Agent:
-    """Create agent with user-specific isolated tools"""
-    # Create tools with user context
-    file_tools = FileTools(user_id, project_id)
-    command_tools = CommandTools(user_id, project_id)
-    edit_tools = EditTools(user_id, project_id)
+    agno_file_logger._configured = True
 
-    # Create agent
-    BACKEND_DESCRIPTION = """
+
+_configure_logging()
+
+
+# =============================================================================
+# BACKEND AGENT PROMPTS (built once at import, shared by every agent)
+# =============================================================================
+
+_BACKEND_DESCRIPTION = """
     Backend Agent V2 — Stateless FastAPI Code Generation Specialist (reactive, rule-driven)
 
     PURPOSE (HIGH-LEVEL):
@@ -119,7 +265,7 @@ async def create_user_agent(user_id: str, project_id: str) -> Agent:
     - NEVER emit placeholders ('pass', '...', '# TODO') in generated code: FULL IMPLEMENTATION IS REQUIRED.
     """
 
-    BACKEND_OUTPUT = """
+_BACKEND_OUTPUT = """
     CRITICAL OUTPUT FORMAT:
     - The agent MUST output a single-line JSON wrapper (no surrounding markdown), immediately followed by the FULL XML string containing all <codeartifact> blocks.
     - No extra text before the JSON and no extra text between the JSON and the XML.
@@ -159,270 +305,339 @@ async def create_user_agent(user_id: str, project_id: str) -> Agent:
     - After successful save_generated_files return, immediately return final confirmation string (see OUTPUT RULES).
     """
 
-    BACKEND_INSTRUCTIONS = [
-        # =========================
-        # GENERAL EXECUTION RULES
-        # =========================
-        "CRITICAL: ALWAYS produce EXACTLY ONE response containing (in this order): analysis, plan, then ALL code artifacts as XML <codeartifact> blocks. Do NOT send multiple messages.",
-        "NEVER produce partial implementations, placeholders, TODOs, or example-only code — full runnable implementations only.",
-        "NEVER create infrastructure/deployment files (Dockerfile, k8s manifests) unless explicitly requested by the user.",
-        "MUST minimize token usage while preserving runnable completeness for the requested scope.",
-        "PERFORMANCE: Prioritize advanced tools (search_file_content, find_files_glob, read_file, write_file) for 5-10x performance improvement over legacy tools.",
-        "CHOOSE editing strategy: Use edit_file/smart_edit_file for small targeted changes; use <codeartifact> blocks for new files or major rewrites.",
-        "CRITICAL: Agent must STOP only after save_generated_files returns success, then return final confirmation and STOP.",
-        # =========================
-        # CODE ITERATION & TOOL SELECTION LOGIC (SCENARIO-BASED)
-        # =========================
-        "SCENARIO 1 - Vague/High-level request (e.g., 'add login', 'create API'):",
-        "  → First call analyze_codebase('Analyze authentication system') or analyze_codebase('Analyze API endpoints')",
-        "  → Then call list_directory('.', recursive=True) to understand project layout with intelligent sorting",
-        "  → Use find_files_glob('**/*.py') to locate all Python files sorted by recent modification",
-        "  → Then decide whether to extend existing files or create new structure",
-        "",
-        "SCENARIO 2 - Specific new feature request (e.g., 'add /tasks CRUD endpoint'):",
-        "  → First call search_file_content('@app.post.*tasks', include='**/*.py') to check for existing duplicates",
-        "  → Then call find_files_glob('backend/*.py') to locate main application files with intelligent sorting",
-        "  → Use read_file() to examine existing structure before generating implementation",
-        "  → Then generate full implementation in correct structure",
-        "",
-        "SCENARIO 3 - Fix/update/modify existing code:",
-        "  → First call read_file('backend/app.py') or target file (supports line ranges for performance)",
-        "  → Use search_file_content() with context_lines=3 to locate specific logic needing changes",
-        "  → For precise changes: use edit_file() with exact text matching",
-        "  → For flexible changes: use smart_edit_file() with semantic understanding",
-        "  → Alternatively, output corrected full file(s) as <codeartifact> blocks",
-        "",
-        "SCENARIO 4 - Incremental code modifications (e.g., 'update function X', 'fix bug in line Y'):",
-        "  → First call read_file() to get current file content (use line ranges for large files)",
-        "  → Use search_file_content() with context_lines=2-5 to locate exact text that needs modification",
-        "  → Use edit_file() for precise replacements when you know exact text",
-        "  → Use smart_edit_file() when formatting/indentation might differ",
-        "  → Prefer incremental edits over full file regeneration for small changes",
-        "",
-        "SCENARIO 5 - Security/auth patterns unclear:",
-        "  → Call search_web('FastAPI JWT auth Pydantic v2 2025 best practice')",
-        "  → Use results to guide secure, idiomatic implementation",
-        # =========================
-        # ADVANCED TOOL DESCRIPTIONS & USAGE GUIDANCE
-        # =========================
-        "search_file_content(pattern, include='**/*', exclude='', context_lines=0, max_results=100):",
-        "  → MULTI-STRATEGY search: git grep → system grep → Python fallback for maximum performance",
-        "  → Find existing logic/endpoints using regex patterns with intelligent file filtering",
-        "  → Examples: search_file_content('@app.post.*login', include='**/*.py'), search_file_content('class.*User', include='backend/**')",
-        "  → Use context_lines=2-5 to see surrounding code context for better understanding",
-        "  → Critical for avoiding duplicate endpoints and understanding existing patterns",
-        "  → Performance: 5-10x faster than basic search tools with git integration",
-        "",
-        "find_files_glob(pattern, root_dir='.', exclude_patterns=[], max_results=1000):",
-        "  → INTELLIGENT file discovery with automatic sorting by modification time (recent first)",
-        "  → Locate relevant source files by glob pattern with advanced exclusion filters",
-        "  → Examples: find_files_glob('**/*.py'), find_files_glob('backend/*.py'), find_files_glob('**/requirements.txt')",
-        "  → Automatically excludes common non-source directories (__pycache__, .git, node_modules, etc.)",
-        "  → Use to find existing backend files before modifying - shows most recently modified first",
-        "  → Superior to basic find_files with intelligent filtering and performance optimization",
-        "",
-        "list_directory(path='.', recursive=False, include_hidden=False, max_depth=10, page=1, per_page=100):",
-        "  → ENHANCED directory listing with pagination and intelligent sorting",
-        "  → Call EARLY to understand project directory structure and layout",
-        "  → Use recursive=True for deep project exploration with controlled depth",
-        "  → Essential for determining SIMPLE vs MODERATE vs COMPLEX structure",
-        "  → Provides file sizes, modification times, and organized output",
-        "  → Pagination support for large directories - use page/per_page for control",
-        "",
-        "read_file(file_path, start_line=None, end_line=None, encoding='utf-8'):",
-        "  → ADVANCED file reading with line-range support and encoding detection",
-        "  → Read entire files or specific line ranges for targeted analysis",
-        "  → Examples: read_file('backend/app.py'), read_file('backend/models.py', start_line=1, end_line=50)",
-        "  → Automatically detects binary files and provides appropriate warnings",
-        "  → Use line ranges to focus on specific functions or classes for performance",
-        "  → Superior to basic read tools with validation and error handling",
-        "",
-        "write_file(file_path, content, create_dirs=True, backup=False, encoding='utf-8'):",
-        "  → INTELLIGENT file writing with automatic directory creation and diff generation",
-        "  → Safely create/update files with comprehensive validation and feedback",
-        "  → Examples: write_file('backend/new_module.py', code_content), write_file('backend/app.py', updated_content, backup=True)",
-        "  → Automatically creates parent directories when create_dirs=True",
-        "  → Shows detailed diffs when updating existing files for change visibility",
-        "  → Use backup=True for critical file updates to preserve original versions",
-        "",
-        "list_files(path='.', recursive=False, show_hidden=False, limit=100):",
-        "  → LEGACY: Basic directory listing - prefer list_directory() for advanced features",
-        "  → Still available for simple directory structure overview",
-        "",
-        "find_files(pattern, limit=50):",
-        "  → LEGACY: Basic file finding - prefer find_files_glob() for advanced features",
-        "  → Still available for simple pattern matching",
-        "",
-        "search_code(pattern, files='**/*', ignore_case=True, limit=30):",
-        "  → LEGACY: Basic code search - prefer search_file_content() for performance",
-        "  → Still available for simple searches but limited compared to advanced tools",
-        "",
-        "analyze_codebase(task, focus_area=''):",
-        "  → Use for broad/ambiguous requests requiring multi-step analysis (leverages advanced tools internally)",
-        "  → Examples: analyze_codebase('Analyze authentication system'), analyze_codebase('Find all API endpoints')",
-        "  → Combines multiple searches and provides structured overview using search_file_content() and find_files_glob()",
-        "",
-        "search_web(query):",
-        "  → Use SPARINGLY for up-to-date FastAPI/Pydantic v2/MongoDB best practices",
-        "  → Only when security patterns, new API features, or modern practices are unclear",
-        "  → Examples: search_web('FastAPI async MongoDB Motor 2025'), search_web('Pydantic v2 validation patterns')",
-        "",
-        "edit_file(file_path, old_string, new_string, expected_replacements=1):",
-        "  → Precise text replacement for exact code modifications with validation",
-        "  → Use when you know the exact text to replace (whitespace-sensitive)",
-        "  → Examples: edit_file('backend/app.py', 'old_function()', 'new_function()')",
-        "  → Can create new files with edit_file(path, '', content)",
-        "  → Always specify expected_replacements to avoid unintended multiple changes",
-        "  → Enhanced with structured error handling for better debugging",
-        "",
-        "smart_edit_file(file_path, old_string, new_string, instruction):",
-        "  → Intelligent editing with semantic understanding and auto-correction",
-        "  → Handles indentation differences, flexible whitespace matching",
-        "  → Examples: smart_edit_file('backend/models.py', 'class User', 'class UserModel', 'Rename User class')",
-        "  → Use when exact text matching might fail due to formatting differences",
-        "  → Instruction parameter helps document the change purpose for better matching",
-        "  → Enhanced with structured error responses for better reliability",
-        # =========================
-        # STARTUP WORKFLOW (CONTEXT UNDERSTANDING)
-        # =========================
-        "1. Parse user request to determine scenario type (vague, specific, fix, security)",
-        "2. Apply appropriate tool selection logic based on scenario - PREFER ADVANCED TOOLS for performance:",
-        "   • Use find_files_glob() instead of find_files() for file discovery",
-        "   • Use search_file_content() instead of search_code() for content search",
-        "   • Use list_directory() instead of list_files() for directory exploration",
-        "   • Use read_file()/write_file() for advanced file operations with validation",
-        "3. Gather sufficient context before generating any code - advanced tools provide richer context",
-        "4. Set complexity: SIMPLE / MODERATE / COMPLEX based on discovered codebase size",
-        "5. Leverage advanced tool features: context_lines, intelligent sorting, line ranges, diff generation",
-        # =========================
-        # ANALYSIS (3–6 bullets) & PLAN (file list)
-        # =========================
-        "Produce a brief ANALYSIS: 3–6 short bullets covering existing codebase insights, complexity classification, auth patterns found, and main implementation decisions.",
-        "Produce a PLAN: one-line per file: 'filename — purpose — routes mapped to file'. Use relative filenames under the 'backend/' directory.",
-        # =========================
-        # FILE & FOLDER RULES (STRUCTURE)
-        # =========================
-        "SIMPLE (default): If <5 models AND <10 endpoints -> FLAT layout: backend/{app.py, models.py, database.py, auth.py? , requirements.txt, .env}.",
-        "MODERATE: 5–10 models or 10–25 endpoints -> add utils.py, config.py; still keep minimal top-level layout.",
-        "COMPLEX: >10 models or >25 endpoints -> allowed package layout: backend/app/, backend/routers/, backend/models/, backend/core/ — only when complexity threshold met.",
-        "MUST NOT create top-level packages for SIMPLE apps. NEVER create migrations/ or tests/ for SIMPLE unless user requests them explicitly.",
-        # =========================
-        # TECH & IMPLEMENTATION RULES
-        # =========================
-        "MUST use: FastAPI (async), Motor AsyncIOMotorClient, Pydantic v2, JWT with timezone-aware expiry if auth required.",
-        "MUST NOT: import or use SQLAlchemy, asyncpg, psycopg2, sqlalchemy.orm, create_engine, Session, Column, alembic, or any SQL patterns.",
-        "MUST implement DB operations with await collection.insert_one/find_one/update_one/delete_one and handle DB errors.",
-        "MUST convert MongoDB ObjectId to str on all outbound responses.",
-        "MUST define Pydantic v2 models that exactly reflect api_spec components.schemas (names, types, required).",
-        "MUST implement authentication flows (hash_password, verify_password, create_access_token) if api_spec requires auth, including token expiry (UTC) and secure signing.",
-        "MUST include HTTPException usage for error paths with correct status codes (400,401,403,404,409,422).",
-        # =========================
-        # CODE QUALITY & STANDARDS
-        # =========================
-        "MUST produce readable, idiomatic Python code (type hints, async/await, small functions).",
-        "MUST include minimal inline comments where they help maintenance, but NO TODO or placeholder comments.",
-        "MUST ensure lintable code: avoid unused imports, function stubs, or unreferenced variables.",
-        "MUST provide requirements.txt (pinned minimal set) and a minimal .env example with keys: MONGODB_URI, JWT_SECRET, ACCESS_TOKEN_EXPIRE_MINUTES (if auth).",
-        # =========================
-        # XML ARTIFACT RULES (PARSER-ALIGNED, ABSOLUTE)
-        # =========================
-        "CRITICAL: All generated files MUST be inside <codeartifact> blocks. ONE block per file.",
-        "FILENAME RULE: filename attribute MUST be relative to the parser base_path and start with 'backend/' (e.g., filename=\"backend/app.py\"). DO NOT prefix with 'generated/'.",
-        'TYPE ALLOWED: type must be one of: "python","text","json","yaml","javascript","html","css".',
-        'REQUIRED ATTRIBUTES: each <codeartifact> MUST include: type, filename, purpose. OPTIONAL: complexity="simple|moderate|complex", dependencies="pkg1,pkg2".',
-        'ATTRIBUTE SYNTAX: Attributes MUST use double quotes. Attribute values MUST NOT contain double quotes ("). Attribute names must be alphanumeric/underscore.',
-        "CONTENT SAFETY: Do NOT include the literal sequence '</codeartifact>' inside code content. Do NOT nest <codeartifact> tags.",
-        "XML VALIDATION: opening <codeartifact ...> count MUST equal closing </codeartifact> count BEFORE any tool call.",
-        "ATTRIBUTE LENGTH: attribute values SHOULD be short (<=120 chars) and contain no newlines.",
-        "EXAMPLE CORRECT ARTIFACT (filenames RELATIVE to base_path):",
-        '<codeartifact type="python" filename="backend/app.py" purpose="Main FastAPI app" complexity="moderate">',
-        "from fastapi import FastAPI",
-        "app = FastAPI()",
-        "@app.get('/')",
-        "async def root():",
-        "    return {'message':'ok'}",
-        "</codeartifact>",
-        # =========================
-        # TOOL CALLING RULES (STRICT)
-        # =========================
-        "Execute save_generated_files(response_text='<FULL_XML>') EXACTLY ONCE with the FULL_XML string (ALL artifacts concatenated).",
-        "Execute each tool at most once per cycle; if a tool fails, retry EXACTLY ONCE (max 2 attempts total).",
-        "NEVER call any tool with partial or unvalidated arguments. Round-trip validate tool arguments via json.dumps -> json.loads when applicable.",
-        "On save_generated_files error: log minimal diagnostics (failed_tool, raw_payload_snippet, parser_location line:col, applied_fix), attempt one targeted repair then retry once. If retry fails -> return error and STOP.",
-        # =========================
-        # PRE-TOOL VALIDATION CHECKLIST (MUST PASS)
-        # =========================
-        "Before invoking save_generated_files validate ALL the following:",
-        "- Opening <codeartifact> tag count equals closing </codeartifact> count.",
-        "- No nested <codeartifact> tags.",
-        "- All filenames are relative and start with 'backend/'.",
-        "- All required files per plan are present (app.py, models.py, database.py, requirements.txt, .env, auth.py if needed).",
-        "- Pydantic models exist for user-requested entities and use proper Pydantic v2 syntax.",
-        "- All route handlers contain awaited DB calls or explicit correct HTTPException behavior.",
-        "- No forbidden patterns present (pass, ..., placeholder returns).",
-        "- XML string is parseable by extract_code_artifacts().",
-        "IF ANY CHECK FAILS -> output: 'ERROR: <brief_issue>. Regenerate required.' and DO NOT call save_generated_files.",
-        # =========================
-        # ERROR HANDLING & DIAGNOSTICS
-        # =========================
-        "On any validation or tool error: produce minimal diagnostics and retry once after targeted fix. If still failing -> return error description and STOP.",
-        "If any gate fails permanently: return EXACT single-line: 'ERROR: <gate> failed. Regenerate required.' and STOP.",
-        # =========================
-        # FORBIDDEN PATTERNS (DO NOT EMIT) + ALTERNATIVES
-        # =========================
-        "NEVER: emit SQL imports or SQL-based code. ALTERNATIVE: use Motor async operations and MongoDB patterns.",
-        "NEVER: return placeholder routes or 'pass'. ALTERNATIVE: raise HTTPException with appropriate status and message if logic can't be implemented.",
-        "NEVER: create endpoints not explicitly requested by user. ALTERNATIVE: focus on user-specified functionality only.",
-        "NEVER: include HTML or presentation markup inside code artifacts. ALTERNATIVE: include API error messages as plain strings.",
-        # =========================
-        # OUTPUT RULES & CONFIRMATIONS
-        # =========================
-        "FINAL OUTPUT ORDER (SINGLE RESPONSE):",
-        "1) analysis — short bullets (existing codebase insights, complexity, implementation decisions),",
-        "2) plan — one-line per file: filename — purpose — routes mapped,",
-        "3) artifacts — ALL <codeartifact> blocks concatenated as FULL_XML (no extra separators),",
-        "4) MUST call save_generated_files(response_text='<FULL_XML>') exactly once,",
-        "5) After tool returns success -> RETURN EXACT string (machine-parseable):",
-        "   'Backend ready — {N} files generated under generated/backend/. Start with: uvicorn app:app --reload'",
-        "6) If save_generated_files fails after retry -> RETURN EXACT string:",
-        "   'Backend generation failed - check XML validation and retry.'",
-        # =========================
-        # QUALITY GATES (MUST PASS BEFORE NEXT PHASE)
-        # =========================
-        "Quality gates: files present, XML valid, models defined, DB ops awaited, auth implemented when required, ObjectId conversions handled, requirements.txt present, no forbidden patterns.",
-        "If any gate fails -> output 'ERROR: <gate> failed. Regenerate required.' and DO NOT call save_generated_files.",
-        # =========================
-        # EXAMPLES (REFERENCE)
-        # =========================
-        "CORRECT XML snippet example (filenames RELATIVE to base_path):",
-        '<codeartifact type="python" filename="backend/app.py" purpose="Main FastAPI app" complexity="moderate">',
-        "from fastapi import FastAPI",
-        "app = FastAPI()",
-        "@app.get('/')",
-        "async def root():",
-        "    return {'message':'ok'}",
-        "</codeartifact>",
-        "",
-        "CORRECT requirements.txt artifact example:",
-        '<codeartifact type="text" filename="backend/requirements.txt" purpose="Pinned dependencies" complexity="simple">',
-        "fastapi==0.110.1",
-        "uvicorn==0.25.0",
-        "motor==3.3.1",
-        "pydantic==2.6.4",
-        "python-dotenv==1.0.1",
-        "</codeartifact>",
-        "",
-        "CORRECT wrapper + XML usage example (compact):",
-        '{"analysis":["Found existing /users endpoint; complexity: simple","No auth system detected"],"plan":["backend/app.py — main routes: /auth/login, /tasks"],"artifacts_length":1024,"artifact_files":["backend/app.py","backend/models.py","backend/database.py","backend/requirements.txt","backend/.env"],"save_call":"save_generated_files(response_text=\'<FULL_XML>\')","final_confirmation":"Backend ready — 5 files generated under generated/backend/. Start with: uvicorn app:app --reload"}',
-        "<FULL_XML_BEGIN>",
-        '<codeartifact type="python" filename="backend/app.py" purpose="Main FastAPI app">',
-        "...full app.py...",
-        "</codeartifact>",
-        "...other artifacts...",
-        "<FULL_XML_END>",
-    ]
-
-    db = SqliteDb(db_file="tmp/multi_agent.db")
+_BACKEND_INSTRUCTIONS: tuple[str, ...] = (
+    # =========================
+    # GENERAL EXECUTION RULES
+    # =========================
+    "CRITICAL: ALWAYS produce EXACTLY ONE response containing (in this order): analysis, plan, then ALL code artifacts as XML <codeartifact> blocks. Do NOT send multiple messages.",
+    "NEVER produce partial implementations, placeholders, TODOs, or example-only code — full runnable implementations only.",
+    "NEVER create infrastructure/deployment files (Dockerfile, k8s manifests) unless explicitly requested by the user.",
+    "MUST minimize token usage while preserving runnable completeness for the requested scope.",
+    "PERFORMANCE: Prioritize advanced tools (search_file_content, find_files_glob, read_file, write_file) for 5-10x performance improvement over legacy tools.",
+    "CHOOSE editing strategy: Use edit_file/smart_edit_file for small targeted changes; use <codeartifact> blocks for new files or major rewrites.",
+    "CRITICAL: Agent must STOP only after save_generated_files returns success, then return final confirmation and STOP.",
+    # =========================
+    # CODE ITERATION & TOOL SELECTION LOGIC (SCENARIO-BASED)
+    # =========================
+    "SCENARIO 1 - Vague/High-level request (e.g., 'add login', 'create API'):",
+    "  → First call analyze_codebase('Analyze authentication system') or analyze_codebase('Analyze API endpoints')",
+    "  → Then call list_directory('.', recursive=True) to understand project layout with intelligent sorting",
+    "  → Use find_files_glob('**/*.py') to locate all Python files sorted by recent modification",
+    "  → Then decide whether to extend existing files or create new structure",
+    "",
+    "SCENARIO 2 - Specific new feature request (e.g., 'add /tasks CRUD endpoint'):",
+    "  → First call search_file_content('@app.post.*tasks', include='**/*.py') to check for existing duplicates",
+    "  → Then call find_files_glob('backend/*.py') to locate main application files with intelligent sorting",
+    "  → Use read_file() to examine existing structure before generating implementation",
+    "  → Then generate full implementation in correct structure",
+    "",
+    "SCENARIO 3 - Fix/update/modify existing code:",
+    "  → First call read_file('backend/app.py') or target file (supports line ranges for performance)",
+    "  → Use search_file_content() with context_lines=3 to locate specific logic needing changes",
+    "  → For precise changes: use edit_file() with exact text matching",
+    "  → For flexible changes: use smart_edit_file() with semantic understanding",
+    "  → Alternatively, output corrected full file(s) as <codeartifact> blocks",
+    "",
+    "SCENARIO 4 - Incremental code modifications (e.g., 'update function X', 'fix bug in line Y'):",
+    "  → First call read_file() to get current file content (use line ranges for large files)",
+    "  → Use search_file_content() with context_lines=2-5 to locate exact text that needs modification",
+    "  → Use edit_file() for precise replacements when you know exact text",
+    "  → Use smart_edit_file() when formatting/indentation might differ",
+    "  → Prefer incremental edits over full file regeneration for small changes",
+    "",
+    "SCENARIO 5 - Security/auth patterns unclear:",
+    "  → Call search_web('FastAPI JWT auth Pydantic v2 2025 best practice')",
+    "  → Use results to guide secure, idiomatic implementation",
+    # =========================
+    # ADVANCED TOOL DESCRIPTIONS & USAGE GUIDANCE
+    # =========================
+    "search_file_content(pattern, include='**/*', exclude='', context_lines=0, max_results=100):",
+    "  → MULTI-STRATEGY search: git grep → system grep → Python fallback for maximum performance",
+    "  → Find existing logic/endpoints using regex patterns with intelligent file filtering",
+    "  → Examples: search_file_content('@app.post.*login', include='**/*.py'), search_file_content('class.*User', include='backend/**')",
+    "  → Use context_lines=2-5 to see surrounding code context for better understanding",
+    "  → Critical for avoiding duplicate endpoints and understanding existing patterns",
+    "  → Performance: 5-10x faster than basic search tools with git integration",
+    "",
+    "find_files_glob(pattern, root_dir='.', exclude_patterns=[], max_results=1000):",
+    "  → INTELLIGENT file discovery with automatic sorting by modification time (recent first)",
+    "  → Locate relevant source files by glob pattern with advanced exclusion filters",
+    "  → Examples: find_files_glob('**/*.py'), find_files_glob('backend/*.py'), find_files_glob('**/requirements.txt')",
+    "  → Automatically excludes common non-source directories (__pycache__, .git, node_modules, etc.)",
+    "  → Use to find existing backend files before modifying - shows most recently modified first",
+    "  → Superior to basic find_files with intelligent filtering and performance optimization",
+    "",
+    "list_directory(path='.', recursive=False, include_hidden=False, max_depth=10, page=1, per_page=100):",
+    "  → ENHANCED directory listing with pagination and intelligent sorting",
+    "  → Call EARLY to understand project directory structure and layout",
+    "  → Use recursive=True for deep project exploration with controlled depth",
+    "  → Essential for determining SIMPLE vs MODERATE vs COMPLEX structure",
+    "  → Provides file sizes, modification times, and organized output",
+    "  → Pagination support for large directories - use page/per_page for control",
+    "",
+    "read_file(file_path, start_line=None, end_line=None, encoding='utf-8'):",
+    "  → ADVANCED file reading with line-range support and encoding detection",
+    "  → Read entire files or specific line ranges for targeted analysis",
+    "  → Examples: read_file('backend/app.py'), read_file('backend/models.py', start_line=1, end_line=50)",
+    "  → Automatically detects binary files and provides appropriate warnings",
+    "  → Use line ranges to focus on specific functions or classes for performance",
+    "  → Superior to basic read tools with validation and error handling",
+    "",
+    "write_file(file_path, content, create_dirs=True, backup=False, encoding='utf-8'):",
+    "  → INTELLIGENT file writing with automatic directory creation and diff generation",
+    "  → Safely create/update files with comprehensive validation and feedback",
+    "  → Examples: write_file('backend/new_module.py', code_content), write_file('backend/app.py', updated_content, backup=True)",
+    "  → Automatically creates parent directories when create_dirs=True",
+    "  → Shows detailed diffs when updating existing files for change visibility",
+    "  → Use backup=True for critical file updates to preserve original versions",
+    "",
+    "list_files(path='.', recursive=False, show_hidden=False, limit=100):",
+    "  → LEGACY: Basic directory listing - prefer list_directory() for advanced features",
+    "  → Still available for simple directory structure overview",
+    "",
+    "find_files(pattern, limit=50):",
+    "  → LEGACY: Basic file finding - prefer find_files_glob() for advanced features",
+    "  → Still available for simple pattern matching",
+    "",
+    "search_code(pattern, files='**/*', ignore_case=True, limit=30):",
+    "  → LEGACY: Basic code search - prefer search_file_content() for performance",
+    "  → Still available for simple searches but limited compared to advanced tools",
+    "",
+    "analyze_codebase(task, focus_area=''):",
+    "  → Use for broad/ambiguous requests requiring multi-step analysis (leverages advanced tools internally)",
+    "  → Examples: analyze_codebase('Analyze authentication system'), analyze_codebase('Find all API endpoints')",
+    "  → Combines multiple searches and provides structured overview using search_file_content() and find_files_glob()",
+    "",
+    "search_web(query):",
+    "  → Use SPARINGLY for up-to-date FastAPI/Pydantic v2/MongoDB best practices",
+    "  → Only when security patterns, new API features, or modern practices are unclear",
+    "  → Examples: search_web('FastAPI async MongoDB Motor 2025'), search_web('Pydantic v2 validation patterns')",
+    "",
+    "edit_file(file_path, old_string, new_string, expected_replacements=1):",
+    "  → Precise text replacement for exact code modifications with validation",
+    "  → Use when you know the exact text to replace (whitespace-sensitive)",
+    "  → Examples: edit_file('backend/app.py', 'old_function()', 'new_function()')",
+    "  → Can create new files with edit_file(path, '', content)",
+    "  → Always specify expected_replacements to avoid unintended multiple changes",
+    "  → Enhanced with structured error handling for better debugging",
+    "",
+    "smart_edit_file(file_path, old_string, new_string, instruction):",
+    "  → Intelligent editing with semantic understanding and auto-correction",
+    "  → Handles indentation differences, flexible whitespace matching",
+    "  → Examples: smart_edit_file('backend/models.py', 'class User', 'class UserModel', 'Rename User class')",
+    "  → Use when exact text matching might fail due to formatting differences",
+    "  → Instruction parameter helps document the change purpose for better matching",
+    "  → Enhanced with structured error responses for better reliability",
+    # =========================
+    # STARTUP WORKFLOW (CONTEXT UNDERSTANDING)
+    # =========================
+    "1. Parse user request to determine scenario type (vague, specific, fix, security)",
+    "2. Apply appropriate tool selection logic based on scenario - PREFER ADVANCED TOOLS for performance:",
+    "   • Use find_files_glob() instead of find_files() for file discovery",
+    "   • Use search_file_content() instead of search_code() for content search",
+    "   • Use list_directory() instead of list_files() for directory exploration",
+    "   • Use read_file()/write_file() for advanced file operations with validation",
+    "3. Gather sufficient context before generating any code - advanced tools provide richer context",
+    "4. Set complexity: SIMPLE / MODERATE / COMPLEX based on discovered codebase size",
+    "5. Leverage advanced tool features: context_lines, intelligent sorting, line ranges, diff generation",
+    # =========================
+    # ANALYSIS (3–6 bullets) & PLAN (file list)
+    # =========================
+    "Produce a brief ANALYSIS: 3–6 short bullets covering existing codebase insights, complexity classification, auth patterns found, and main implementation decisions.",
+    "Produce a PLAN: one-line per file: 'filename — purpose — routes mapped to file'. Use relative filenames under the 'backend/' directory.",
+    # =========================
+    # FILE & FOLDER RULES (STRUCTURE)
+    # =========================
+    "SIMPLE (default): If <5 models AND <10 endpoints -> FLAT layout: backend/{app.py, models.py, database.py, auth.py? , requirements.txt, .env}.",
+    "MODERATE: 5–10 models or 10–25 endpoints -> add utils.py, config.py; still keep minimal top-level layout.",
+    "COMPLEX: >10 models or >25 endpoints -> allowed package layout: backend/app/, backend/routers/, backend/models/, backend/core/ — only when complexity threshold met.",
+    "MUST NOT create top-level packages for SIMPLE apps. NEVER create migrations/ or tests/ for SIMPLE unless user requests them explicitly.",
+    # =========================
+    # TECH & IMPLEMENTATION RULES
+    # =========================
+    "MUST use: FastAPI (async), Motor AsyncIOMotorClient, Pydantic v2, JWT with timezone-aware expiry if auth required.",
+    "MUST NOT: import or use SQLAlchemy, asyncpg, psycopg2, sqlalchemy.orm, create_engine, Session, Column, alembic, or any SQL patterns.",
+    "MUST implement DB operations with await collection.insert_one/find_one/update_one/delete_one and handle DB errors.",
+    "MUST convert MongoDB ObjectId to str on all outbound responses.",
+    "MUST define Pydantic v2 models that exactly reflect api_spec components.schemas (names, types, required).",
+    "MUST implement authentication flows (hash_password, verify_password, create_access_token) if api_spec requires auth, including token expiry (UTC) and secure signing.",
+    "MUST include HTTPException usage for error paths with correct status codes (400,401,403,404,409,422).",
+    # =========================
+    # CODE QUALITY & STANDARDS
+    # =========================
+    "MUST produce readable, idiomatic Python code (type hints, async/await, small functions).",
+    "MUST include minimal inline comments where they help maintenance, but NO TODO or placeholder comments.",
+    "MUST ensure lintable code: avoid unused imports, function stubs, or unreferenced variables.",
+    "MUST provide requirements.txt (pinned minimal set) and a minimal .env example with keys: MONGODB_URI, JWT_SECRET, ACCESS_TOKEN_EXPIRE_MINUTES (if auth).",
+    # =========================
+    # XML ARTIFACT RULES (PARSER-ALIGNED, ABSOLUTE)
+    # =========================
+    "CRITICAL: All generated files MUST be inside <codeartifact> blocks. ONE block per file.",
+    "FILENAME RULE: filename attribute MUST be relative to the parser base_path and start with 'backend/' (e.g., filename=\"backend/app.py\"). DO NOT prefix with 'generated/'.",
+    'TYPE ALLOWED: type must be one of: "python","text","json","yaml","javascript","html","css".',
+    'REQUIRED ATTRIBUTES: each <codeartifact> MUST include: type, filename, purpose. OPTIONAL: complexity="simple|moderate|complex", dependencies="pkg1,pkg2".',
+    'ATTRIBUTE SYNTAX: Attributes MUST use double quotes. Attribute values MUST NOT contain double quotes ("). Attribute names must be alphanumeric/underscore.',
+    "CONTENT SAFETY: Do NOT include the literal sequence '</codeartifact>' inside code content. Do NOT nest <codeartifact> tags.",
+    "XML VALIDATION: opening <codeartifact ...> count MUST equal closing </codeartifact> count BEFORE any tool call.",
+    "ATTRIBUTE LENGTH: attribute values SHOULD be short (<=120 chars) and contain no newlines.",
+    "EXAMPLE CORRECT ARTIFACT (filenames RELATIVE to base_path):",
+    '<codeartifact type="python" filename="backend/app.py" purpose="Main FastAPI app" complexity="moderate">',
+    "from fastapi import FastAPI",
+    "app = FastAPI()",
+    "@app.get('/')",
+    "async def root():",
+    "    return {'message':'ok'}",
+    "</codeartifact>",
+    # =========================
+    # TOOL CALLING RULES (STRICT)
+    # =========================
+    "Execute save_generated_files(response_text='<FULL_XML>') EXACTLY ONCE with the FULL_XML string (ALL artifacts concatenated).",
+    "Execute each tool at most once per cycle; if a tool fails, retry EXACTLY ONCE (max 2 attempts total).",
+    "NEVER call any tool with partial or unvalidated arguments. Round-trip validate tool arguments via json.dumps -> json.loads when applicable.",
+    "On save_generated_files error: log minimal diagnostics (failed_tool, raw_payload_snippet, parser_location line:col, applied_fix), attempt one targeted repair then retry once. If retry fails -> return error and STOP.",
+    # =========================
+    # PRE-TOOL VALIDATION CHECKLIST (MUST PASS)
+    # =========================
+    "Before invoking save_generated_files validate ALL the following:",
+    "- Opening <codeartifact> tag count equals closing </codeartifact> count.",
+    "- No nested <codeartifact> tags.",
+    "- All filenames are relative and start with 'backend/'.",
+    "- All required files per plan are present (app.py, models.py, database.py, requirements.txt, .env, auth.py if needed).",
+    "- Pydantic models exist for user-requested entities and use proper Pydantic v2 syntax.",
+    "- All route handlers contain awaited DB calls or explicit correct HTTPException behavior.",
+    "- No forbidden patterns present (pass, ..., placeholder returns).",
+    "- XML string is parseable by extract_code_artifacts().",
+    "IF ANY CHECK FAILS -> output: 'ERROR: <brief_issue>. Regenerate required.' and DO NOT call save_generated_files.",
+    # =========================
+    # ERROR HANDLING & DIAGNOSTICS
+    # =========================
+    "On any validation or tool error: produce minimal diagnostics and retry once after targeted fix. If still failing -> return error description and STOP.",
+    "If any gate fails permanently: return EXACT single-line: 'ERROR: <gate> failed. Regenerate required.' and STOP.",
+    # =========================
+    # FORBIDDEN PATTERNS (DO NOT EMIT) + ALTERNATIVES
+    # =========================
+    "NEVER: emit SQL imports or SQL-based code. ALTERNATIVE: use Motor async operations and MongoDB patterns.",
+    "NEVER: return placeholder routes or 'pass'. ALTERNATIVE: raise HTTPException with appropriate status and message if logic can't be implemented.",
+    "NEVER: create endpoints not explicitly requested by user. ALTERNATIVE: focus on user-specified functionality only.",
+    "NEVER: include HTML or presentation markup inside code artifacts. ALTERNATIVE: include API error messages as plain strings.",
+    # =========================
+    # OUTPUT RULES & CONFIRMATIONS
+    # =========================
+    "FINAL OUTPUT ORDER (SINGLE RESPONSE):",
+    "1) analysis — short bullets (existing codebase insights, complexity, implementation decisions),",
+    "2) plan — one-line per file: filename — purpose — routes mapped,",
+    "3) artifacts — ALL <codeartifact> blocks concatenated as FULL_XML (no extra separators),",
+    "4) MUST call save_generated_files(response_text='<FULL_XML>') exactly once,",
+    "5) After tool returns success -> RETURN EXACT string (machine-parseable):",
+    "   'Backend ready — {N} files generated under generated/backend/. Start with: uvicorn app:app --reload'",
+    "6) If save_generated_files fails after retry -> RETURN EXACT string:",
+    "   'Backend generation failed - check XML validation and retry.'",
+    # =========================
+    # QUALITY GATES (MUST PASS BEFORE NEXT PHASE)
+    # =========================
+    "Quality gates: files present, XML valid, models defined, DB ops awaited, auth implemented when required, ObjectId conversions handled, requirements.txt present, no forbidden patterns.",
+    "If any gate fails -> output 'ERROR: <gate> failed. Regenerate required.' and DO NOT call save_generated_files.",
+    # =========================
+    # EXAMPLES (REFERENCE)
+    # =========================
+    "CORRECT XML snippet example (filenames RELATIVE to base_path):",
+    '<codeartifact type="python" filename="backend/app.py" purpose="Main FastAPI app" complexity="moderate">',
+    "from fastapi import FastAPI",
+    "app = FastAPI()",
+    "@app.get('/')",
+    "async def root():",
+    "    return {'message':'ok'}",
+    "</codeartifact>",
+    "",
+    "CORRECT requirements.txt artifact example:",
+    '<codeartifact type="text" filename="backend/requirements.txt" purpose="Pinned dependencies" complexity="simple">',
+    "fastapi==0.110.1",
+    "uvicorn==0.25.0",
+    "motor==3.3.1",
+    "pydantic==2.6.4",
+    "python-dotenv==1.0.1",
+    "</codeartifact>",
+    "",
+    "CORRECT wrapper + XML usage example (compact):",
+    '{"analysis":["Found existing /users endpoint; complexity: simple","No auth system detected"],"plan":["backend/app.py — main routes: /auth/login, /tasks"],"artifacts_length":1024,"artifact_files":["backend/app.py","backend/models.py","backend/database.py","backend/requirements.txt","backend/.env"],"save_call":"save_generated_files(response_text=\'<FULL_XML>\')","final_confirmation":"Backend ready — 5 files generated under generated/backend/. Start with: uvicorn app:app --reload"}',
+    "<FULL_XML_BEGIN>",
+    '<codeartifact type="python" filename="backend/app.py" purpose="Main FastAPI app">',
+    "...full app.py...",
+    "</codeartifact>",
+    "...other artifacts...",
+    "<FULL_XML_END>",
+)
+
+# Pre-rendered once: Agno lays out a multi-entry instruction list as "- item"
+# lines, so joining the same way keeps the system prompt identical while
+# sparing the per-run join.
+_BACKEND_INSTRUCTIONS_TEXT: str = "\n".join(
+    f"- {instruction}" for instruction in _BACKEND_INSTRUCTIONS
+)
+
+
+_AGENT_DB_FILE = "tmp/multi_agent.db"
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+@functools.cache
+def _get_agent_db():
+    """Shared SQLite store for agent history, created once per process in WAL mode"""
+    from agno.db.sqlite import SqliteDb
+    from sqlalchemy import create_engine, event
+
+    db_path = os.path.abspath(_AGENT_DB_FILE)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    engine = create_engine(f"sqlite:///{db_path}")
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in _SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return SqliteDb(db_engine=engine)
+
+
+# Tool sets kept per user+project; size it above the peak number of
+# concurrently active pairs
+_AGENT_CACHE_SIZE = int(os.getenv("AGENT_CACHE_SIZE", "1024"))
+
+
+@functools.lru_cache(maxsize=_AGENT_CACHE_SIZE)
+def _get_user_tools(user_id: str, project_id: str) -> tuple:
+    """FileTools/CommandTools/EditTools for a user+project, built once and reused"""
+    from file_tools_e2b import FileTools
+    from command_tools_e2b import CommandTools
+    from edit_tools_e2b import EditTools
+
+    return (
+        FileTools(user_id, project_id),
+        CommandTools(user_id, project_id),
+        EditTools(user_id, project_id),
+    )
+
+
+def create_user_agent(user_id: str, project_id: str) -> Agent:
+    """
+    Create agent with user-specific isolated tools.
+
+    Only the tools are cached; the Agent itself keeps per-run and session
+    state, so every call returns a fresh one with its own session.
+    """
+    # Deferred so importing this module doesn't pay for the model/tool stacks
+    from agno.models.openrouter import OpenRouter
+
+    from search_tool import search_web
+
+    # Create tools with user context
+    file_tools, command_tools, edit_tools = _get_user_tools(user_id, project_id)
 
     # Create the Backend Agent V2 - Stateless Code Generation Specialist
     backend_agent = Agent(
@@ -435,15 +650,15 @@ async def create_user_agent(user_id: str, project_id: str) -> Agent:
             client_params={"max_retries": 2},
             max_tokens=18024,
         ),
-        db=db,
-        description=BACKEND_DESCRIPTION,
-        instructions=BACKEND_INSTRUCTIONS,
-        expected_output=BACKEND_OUTPUT,
+        db=_get_agent_db(),
+        description=_BACKEND_DESCRIPTION,
+        instructions=_BACKEND_INSTRUCTIONS_TEXT,
+        expected_output=_BACKEND_OUTPUT,
         tools=[file_tools, command_tools, edit_tools, search_web],
         exponential_backoff=True,
         retries=2,
         delay_between_retries=1,
-        debug_mode=True,
+        debug_mode=log_level == logging.DEBUG,
         debug_level=2,
         add_history_to_context=True,
         num_history_runs=5,
@@ -451,6 +666,10 @@ async def create_user_agent(user_id: str, project_id: str) -> Agent:
     return backend_agent
 
 
+_BANNER = "=" * 80
+_DIVIDER = "-" * 80
+
+
 # Usage example
 async def main():
     # Initialize database first
@@ -459,20 +678,23 @@ async def main():
         await init_db(use_direct=False)  # Use pooled connection for application
         agno_file_logger.info("✓ Database initialized successfully")
     except Exception as e:
-        agno_file_logger.error(f"Failed to initialize database: {e}")
+        agno_file_logger.error("Failed to initialize database: %s", e)
         agno_file_logger.warning("Continuing without database tracking...")
+
+    # Resolve the sandbox manager once for the whole session
+    manager = await get_multi_tenant_manager()
     
     # Add logging at the start
-    agno_file_logger.info("=" * 80)
-    agno_file_logger.info("STARTING MULTI-USER AGENT TEST SESSION")
-    agno_file_logger.info("=" * 80)
+    agno_file_logger.info(
+        "%s\nSTARTING MULTI-USER AGENT TEST SESSION\n%s", _BANNER, _BANNER
+    )
 
     # User 1, Project A
     agno_file_logger.info("Creating agent for user_test_adi01, project_A01")
-    agent_user1_projectA = await create_user_agent("user_test_adi01", "project_A01")
+    agent_user1_projectA = create_user_agent("user_test_adi01", "project_A01")
 
     agno_file_logger.info("Starting agent execution with command/file tools test")
-    agno_file_logger.info("-" * 80)
+    agno_file_logger.info(_DIVIDER)
     
     # Note: Session will be auto-created by FileTools/EditTools when they track files
     # No need to pre-create session here - let the tools handle it automatically
@@ -484,27 +706,27 @@ async def main():
     # "Can u create a folder temp-e2b and some python code in python such that after run that file using run command such that we can test the command tools and file tools both at same time"
     # "Can u create a folder temp-e2b and the goal we have is to test the edit tools by creating a python fastapi backend server and then add api features using edit tools and edit some existing apis using edit tools"
 
-    agno_file_logger.info("-" * 80)
+    agno_file_logger.info(_DIVIDER)
     agno_file_logger.info("Agent execution completed")
-    agno_file_logger.info(f"Result preview: {str(result1)[:200]}...")
+    agno_file_logger.info("Result preview: %.200s...", result1)
 
     print(result1)
 
     # Get statistics
     agno_file_logger.info("Fetching sandbox statistics")
-    manager = await get_multi_tenant_manager()
     stats = manager.get_stats()
 
-    agno_file_logger.info(f"Sandbox Statistics: {stats}")
-    print("\nSandbox Statistics:")
-    print(f"Active sandboxes: {stats['active_sandboxes']}")  # Should be 3
-    print(f"Unique users: {stats['unique_users']}")  # Should be 2
-    print(f"Distribution: {stats['user_distribution']}")
+    if agno_file_logger.isEnabledFor(logging.INFO):
+        agno_file_logger.info("Sandbox Statistics: %s", json.dumps(stats))
+    sys.stdout.write(
+        "\nSandbox Statistics:\n"
+        f"Active sandboxes: {stats['active_sandboxes']}\n"  # Should be 3
+        f"Unique users: {stats['unique_users']}\n"  # Should be 2
+        f"Distribution: {stats['user_distribution']}\n"
+    )
 
     
-    agno_file_logger.info("=" * 80)
-    agno_file_logger.info("TEST SESSION COMPLETED")
-    agno_file_logger.info("=" * 80)
+    agno_file_logger.info("%s\nTEST SESSION COMPLETED\n%s", _BANNER, _BANNER)
     
     # Cleanup database connections
     agno_file_logger.info("Closing database connections...")
@@ -120,6 +120,9 @@ class MultiTenantSandboxManager:
             "rejected_requests": 0,
         }
 
+        # Live sandbox count per user, updated on every pool add/remove
+        self._user_distribution: Dict[str, int] = {}
+
         self._initialized = True
         self.logger.info("=" * 80)
         self.logger.info("MultiTenantSandboxManager initialized")
@@ -303,6 +306,10 @@ class MultiTenantSandboxManager:
                 )
 
                 async with self._pool_lock:
+                    if key not in self._sandbox_pool:
+                        self._user_distribution[user_id] = (
+                            self._user_distribution.get(user_id, 0) + 1
+                        )
                     self._sandbox_pool[key] = sandbox_info
                     self._stats["total_sandboxes_created"] += 1
                     self._stats["active_sandboxes"] = len(self._sandbox_pool)
@@ -376,6 +383,11 @@ class MultiTenantSandboxManager:
                     self.logger.warning(f"Error closing sandbox: {e}")
 
                 del self._sandbox_pool[key]
+                remaining = self._user_distribution[key[0]] - 1
+                if remaining:
+                    self._user_distribution[key[0]] = remaining
+                else:
+                    del self._user_distribution[key[0]]
                 self._stats["active_sandboxes"] = len(self._sandbox_pool)
                 self._stats["cleaned_up_sandboxes"] += 1
 
@@ -421,19 +433,15 @@ class MultiTenantSandboxManager:
 
     def get_stats(self) -> Dict[str, Any]:
         """Get manager statistics"""
-        user_distribution = {}
-        for user_id, project_id in self._sandbox_pool.keys():
-            user_distribution[user_id] = user_distribution.get(user_id, 0) + 1
-
         return {
             "total_sandboxes_created": self._stats["total_sandboxes_created"],
             "active_sandboxes": len(self._sandbox_pool),
             "total_requests": self._stats["total_requests"],
             "cleaned_up_sandboxes": self._stats["cleaned_up_sandboxes"],
             "rejected_requests": self._stats["rejected_requests"],
-            "unique_users": len(set(key[0] for key in self._sandbox_pool.keys())),
+            "unique_users": len(self._user_distribution),
             "unique_projects": len(self._sandbox_pool),
-            "user_distribution": user_distribution,
+            "user_distribution": self._user_distribution.copy(),
             "sandbox_details": [
                 {
                     "user_id": info.user_id,
@@ -484,6 +492,10 @@ async def get_multi_tenant_manager() -> MultiTenantSandboxManager:
     """Get the global multi-tenant manager"""
     global _multi_tenant_manager
 
+    # Fast path: already initialized, skip the lock
+    if _multi_tenant_manager is not None:
+        return _multi_tenant_manager
+
     async with _manager_lock:
         if _multi_tenant_manager is None:
             _multi_tenant_manager = MultiTenantSandboxManager()
@@ -5,10 +5,14 @@ This ensures migrations use the DIRECT connection (port 5432) instead of pooled.
 Usage:
     python scripts/run_migrations.py
 """
-import os
 import sys
+import time
+import traceback
 from pathlib import Path
 
+from alembic import command
+from alembic.config import Config
+
 # Add project root to path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
@@ -22,34 +26,31 @@ def main():
     print("Running Database Migrations")
     print("=" * 60)
     
-    settings = get_db_settings()
-    
-    # Get DIRECT connection URL for migrations (port 5432)
-    direct_url = settings.get_connection_url(use_direct=True)
-    
-    # Convert asyncpg URL to sync for Alembic
-    # Alembic uses psycopg2 by default (sync driver)
-    sync_url = direct_url.replace("postgresql+asyncpg://", "postgresql://")
+    # Fail fast on missing settings; alembic/env.py builds the DIRECT
+    # connection URL (port 5432) from these itself
+    get_db_settings()
     
     print(f"✓ Using direct connection for migrations")
     print(f"✓ Database configured")
     print()
     
-    # Set environment variable for Alembic (backup method)
-    os.environ["ALEMBIC_DATABASE_URL"] = sync_url
-    
-    # Run Alembic upgrade
+    # Run Alembic upgrade in-process (no shell + second interpreter start-up)
     print("Running: alembic upgrade head")
     print("-" * 60)
-    exit_code = os.system("alembic upgrade head")
-    
-    if exit_code == 0:
-        print("-" * 60)
-        print("✅ Migrations completed successfully!")
-    else:
+    started = time.perf_counter()
+    try:
+        command.upgrade(Config(str(project_root / "alembic.ini")), "head")
+    except Exception as e:
         print("-" * 60)
-        print(f"❌ Migration failed with exit code: {exit_code}")
-        sys.exit(exit_code)
+        traceback.print_exc()
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+
+    print("-" * 60)
+    print(
+        f"✅ Migrations completed successfully "
+        f"({time.perf_counter() - started:.1f}s)!"
+    )
 
 
 if __name__ == "__main__":
@@ -1,4 +1,10 @@
 # db/restore.py
+import asyncio
+import gzip
+import hashlib
+import itertools
+import os
+import shlex
 from sqlalchemy.ext.asyncio import AsyncSession
 from e2b import AsyncSandbox
 from db.repositories import FileRepository
@@ -6,6 +12,47 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Max sandbox uploads in flight during a restore
+RESTORE_CONCURRENCY = int(os.getenv("RESTORE_CONCURRENCY", "16"))
+# Files per upload; a batch starts as soon as its rows arrive from the DB
+RESTORE_BATCH_SIZE = int(os.getenv("RESTORE_BATCH_SIZE", "50"))
+# Larger text files are uploaded gzipped and unpacked inside the sandbox
+RESTORE_COMPRESS_THRESHOLD = 4096
+
+_PRECOMPRESSED_EXTENSIONS = (
+    ".gz", ".tgz", ".zip", ".br", ".png", ".jpg", ".jpeg", ".gif", ".webp",
+    ".woff", ".woff2",
+)
+
+
+def _upload_entry(file_version, compress: bool = True):
+    """Return (upload_path, data, compressed) for writing a file version"""
+    content = file_version.content
+    if (
+        compress
+        and len(content) > RESTORE_COMPRESS_THRESHOLD
+        and not file_version.file_path.lower().endswith(_PRECOMPRESSED_EXTENSIONS)
+    ):
+        payload = gzip.compress(content.encode("utf-8"), compresslevel=1)
+        return file_version.file_path + ".gz", payload, True
+    return file_version.file_path, content, False
+
+
+async def _sandbox_digests(sandbox: AsyncSandbox, file_versions) -> dict[str, str]:
+    """Return the current sha256 of each file path in the sandbox; missing files are omitted"""
+    paths = " ".join(shlex.quote(fv.file_path) for fv in file_versions)
+    try:
+        result = await sandbox.commands.run(f"sha256sum -- {paths} 2>/dev/null; true")
+    except Exception as e:
+        logger.warning("Failed to hash sandbox files, restoring all of them: %s", e)
+        return {}
+    digests = {}
+    for line in result.stdout.splitlines():
+        digest, _, path = line.partition("  ")
+        if path:
+            digests[path] = digest
+    return digests
+
 
 async def restore_project_files(
     session: AsyncSession,
@@ -15,20 +62,121 @@ async def restore_project_files(
     """
     Restore all project files from database to sandbox.
     Returns dict mapping file paths to versions.
+
+    Files already present in the sandbox with the same content hash are
+    not re-written.
     """
     file_repo = FileRepository(session)
-    latest_files = await file_repo.get_all_latest_files(project_id)
-    
-    restored = {}
-    for file_version in latest_files:
+    unchanged = []
+
+    semaphore = asyncio.Semaphore(RESTORE_CONCURRENCY)
+    bulk_write = hasattr(sandbox.files, "write_files")
+    compressed_files = []
+
+    async def _restore_one(file_version, compress=True):
+        async with semaphore:
+            try:
+                path, data, compressed = _upload_entry(file_version, compress)
+                await sandbox.files.write(path, data)
+                if compressed:
+                    compressed_files.append(file_version)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        "Restored %s (v%d)", file_version.file_path, file_version.version
+                    )
+                return file_version
+            except Exception as e:
+                logger.error("Failed to restore %s: %s", file_version.file_path, e)
+                return None
+
+    async def _restore_batch(batch):
+        # One sha256sum over the batch finds files that are already current
+        async with semaphore:
+            current = await _sandbox_digests(sandbox, batch)
+        pending = []
+        for file_version in batch:
+            digest = hashlib.sha256(file_version.content.encode("utf-8")).hexdigest()
+            if current.get(file_version.file_path) == digest:
+                unchanged.append(file_version)
+            else:
+                pending.append(file_version)
+        batch = pending
+        if not batch:
+            return []
+
+        if bulk_write and len(batch) > 1:
+            # One multi-file upload instead of a round trip per file
+            from e2b.sandbox.filesystem.filesystem import WriteEntry
+
+            uploads = [_upload_entry(fv) for fv in batch]
+            try:
+                async with semaphore:
+                    await sandbox.files.write_files(
+                        [WriteEntry(path=path, data=data) for path, data, _ in uploads]
+                    )
+            except Exception as e:
+                logger.warning("Bulk restore failed, falling back to per-file writes: %s", e)
+            else:
+                compressed_files.extend(
+                    fv for fv, (_, _, compressed) in zip(batch, uploads) if compressed
+                )
+                if logger.isEnabledFor(logging.DEBUG):
+                    for file_version in batch:
+                        logger.debug(
+                            "Restored %s (v%d)", file_version.file_path, file_version.version
+                        )
+                return batch
+
+        return await asyncio.gather(*(_restore_one(fv) for fv in batch))
+
+    # Start uploading each batch while the next rows are still streaming in
+    tasks = []
+    batch = []
+    try:
+        async for file_version in file_repo.iter_all_latest_files(project_id):
+            batch.append(file_version)
+            if len(batch) >= RESTORE_BATCH_SIZE:
+                tasks.append(asyncio.create_task(_restore_batch(batch)))
+                batch = []
+        if batch:
+            tasks.append(asyncio.create_task(_restore_batch(batch)))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    results = await asyncio.gather(*tasks)
+
+    restored = {
+        fv.file_path: fv.version
+        for fv in itertools.chain(unchanged, *results)
+        if fv is not None
+    }
+
+    if compressed_files:
+        # Unpack every gzipped upload with a single command
+        gz_paths = " ".join(shlex.quote(fv.file_path + ".gz") for fv in compressed_files)
         try:
-            await sandbox.files.write(
-                file_version.file_path,
-                file_version.content
-            )
-            restored[file_version.file_path] = file_version.version
-            logger.info(f"Restored {file_version.file_path} (v{file_version.version})")
+            await sandbox.commands.run(f"gunzip -f {gz_paths}")
         except Exception as e:
-            logger.error(f"Failed to restore {file_version.file_path}: {e}")
-    
+            logger.warning(
+                "gunzip failed in sandbox, re-uploading %d files uncompressed: %s",
+                len(compressed_files), e,
+            )
+            retried = await asyncio.gather(
+                *(_restore_one(fv, compress=False) for fv in compressed_files)
+            )
+            for file_version, result in zip(compressed_files, retried):
+                if result is None:
+                    restored.pop(file_version.file_path, None)
+            # Don't leave the uploaded .gz copies in the user's project
+            try:
+                await sandbox.commands.run(f"rm -f -- {gz_paths}")
+            except Exception as e:
+                logger.warning("Failed to remove gzipped uploads from sandbox: %s", e)
+
+    logger.info(
+        "Restored %d files for project %s (%d unchanged)",
+        len(restored), project_id, len(unchanged),
+    )
     return restored